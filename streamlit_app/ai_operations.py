@@ -1,39 +1,33 @@
 import os
 import openai
 import logging
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterator, Tuple
+from prompts import (
+    SANTA_PROMPT_ID,
+    GIFT_SUGGESTIONS_PROMPT_ID,
+    santa_prompt_sections,
+    gift_suggestions_prompt_sections,
+    assemble_messages,
+    section_token_counts,
+    record_prompt_usage
+)
 
 def generate_santa_response(messages: List[Dict], budget: Optional[str] = None) -> Optional[str]:
     """Generate a single response from Santa Claus"""
     try:
-        # Add budget to system prompt if available
-        system_messages = [{"role": "system", "content": SANTA_PROMPT}]
-        if budget:
-            budget_prompt = f"""
-            IMPORTANT: The gift budget is {budget}. 
-            - Ensure all questions consider this budget range
-            - Adjust options to be appropriate for this price range
-            - Focus on value-oriented questions for lower budgets
-            - Consider luxury preferences for higher budgets
-            """
-            system_messages.append({"role": "system", "content": budget_prompt})
-        
-        system_messages.append({
-            "role": "system", 
-            "content": "Remember to structure your response with all XML tags: <covered_questions>, <remaining_questions>, <thinking>, <question>, and <multiple_choice_options>. This is crucial for tracking conversation progress."
-        })
+        # Static sections first so every turn shares the same cacheable prefix
+        sections = santa_prompt_sections(messages, budget)
 
         response = openai.chat.completions.create(
             model="GS-GPT4o-global",  # Using Azure model
-            messages=[
-                *system_messages,
-                *messages
-            ],
+            messages=assemble_messages(sections),
             temperature=0.3,
             max_tokens=1000,
             n=1
         )
         
+        record_prompt_usage(SANTA_PROMPT_ID, response.usage, section_token_counts(sections))
+        
         content = response.choices[0].message.content
         if "<question>" in content and "<multiple_choice_options>" in content:
             parts = content.split("<question>")
@@ -57,50 +51,91 @@ def generate_santa_response(messages: List[Dict], budget: Optional[str] = None)
         logging.error(f"Error generating Santa response: {e}")
         return None
 
-def generate_gift_suggestions(messages: List[Dict], budget: Optional[str] = None) -> List[str]:
-    """Generate gift ideas based on chat messages using GPT"""
-    try:
-        # Format the chat history for better context
-        chat_summary = format_chat_summary(messages)
-        
-        response = openai.chat.completions.create(
-            model="GS-GPT4o-global",  # Using Azure model
-            messages=[
-                {"role": "system", "content": GIFT_SUGGESTIONS_PROMPT + (f"\n\nBudget range: {budget}" if budget else "")},
-                {"role": "user", "content": chat_summary}
-            ],
-            temperature=0.7,
-            max_tokens=1000
-        )
-        
-        content = response.choices[0].message.content
-        suggestions = []
-        
-        # Split content into individual suggestions
-        raw_suggestions = content.split("🎁")
-        for suggestion in raw_suggestions:
-            if not suggestion.strip():
-                continue
-                
-            # Extract suggestion and keywords
-            if "<keywords>" in suggestion and "</keywords>" in suggestion:
-                parts = suggestion.split("<keywords>")
-                suggestion_text = parts[0].strip()
-                keywords = parts[1].split("</keywords>")[0].strip()
-                suggestions.append({
-                    "text": f"🎁 {suggestion_text}",
-                    "keywords": keywords
-                })
-            else:
-                suggestions.append({
-                    "text": f"🎁 {suggestion.strip()}",
-                    "keywords": ""
-                })
-        return suggestions
-        
-    except Exception as e:
-        logging.error(f"Error generating gift ideas: {e}")
-        return []
+def stream_gift_suggestions(messages: List[Dict], budget: Optional[str] = None, timeout: float = 60.0) -> Iterator[Dict]:
+    """Yield each gift suggestion as soon as its block has been fully generated"""
+    # Format the chat history for better context
+    chat_summary = format_chat_summary(messages)
+    sections = gift_suggestions_prompt_sections(chat_summary, budget)
+    
+    response = openai.chat.completions.create(
+        model="GS-GPT4o-global",  # Using Azure model
+        messages=assemble_messages(sections),
+        temperature=0.7,
+        max_tokens=1000,
+        stream=True,
+        stream_options={"include_usage": True},
+        timeout=timeout
+    )
+    
+    buffer = ""
+    # Text between </keywords> and the next 🎁 belongs to no suggestion
+    skipping = False
+    for chunk in response:
+        # Usage arrives on a final chunk without choices
+        if getattr(chunk, "usage", None):
+            record_prompt_usage(GIFT_SUGGESTIONS_PROMPT_ID, chunk.usage, section_token_counts(sections))
+        # Azure sends chunks without choices (e.g. content filter results)
+        if not chunk.choices:
+            continue
+        buffer += chunk.choices[0].delta.content or ""
+        while True:
+            if skipping:
+                next_gift = buffer.find("🎁")
+                if next_gift == -1:
+                    buffer = ""
+                    break
+                buffer = buffer[next_gift:]
+                skipping = False
+            block, buffer, skipping = _pop_completed_block(buffer)
+            if block is None:
+                break
+            if suggestion := parse_suggestion_block(block):
+                yield suggestion
+    
+    # Whatever is left when the stream ends is the last suggestion
+    if not skipping and (suggestion := parse_suggestion_block(buffer)):
+        yield suggestion
+
+def _pop_completed_block(buffer: str) -> Tuple[Optional[str], str, bool]:
+    """
+    Split the first finished suggestion off the buffer
+
+    Returns:
+        tuple: The block (or None if no block is finished yet), the remaining
+        buffer, and whether the block was closed by its </keywords> tag
+    """
+    buffer = buffer.lstrip()
+    # A block ends with its keywords, or where the next suggestion starts
+    keywords_end = buffer.find("</keywords>")
+    next_gift = buffer.find("🎁", 1)
+    if keywords_end != -1 and (next_gift == -1 or keywords_end < next_gift):
+        cut = keywords_end + len("</keywords>")
+        return buffer[:cut], buffer[cut:], True
+    if next_gift != -1:
+        return buffer[:next_gift], buffer[next_gift:], False
+    return None, buffer, False
+
+def parse_suggestion_block(block: str) -> Optional[Dict]:
+    """Parse a single "🎁 ... <keywords>...</keywords>" block into a suggestion"""
+    block = block.strip()
+    if block.startswith("🎁"):
+        block = block[1:]
+    if not block.strip():
+        return None
+    
+    # Extract suggestion and keywords
+    if "<keywords>" in block and "</keywords>" in block:
+        parts = block.split("<keywords>")
+        suggestion_text = parts[0].strip()
+        keywords = parts[1].split("</keywords>")[0].strip()
+        return {
+            "text": f"🎁 {suggestion_text}",
+            "keywords": keywords
+        }
+    return {
+        "text": f"🎁 {block.strip()}",
+        "keywords": ""
+    }
 
 def format_chat_summary(messages: List[Dict]) -> str:
     """Format chat history for GPT context"""
@@ -118,133 +153,3 @@ def format_chat_summary(messages: List[Dict]) -> str:
             chat_summary += f"They answered: {msg['content']}\n"
     
     return chat_summary
-
-# Constants
-SANTA_PROMPT = """You are Santa Claus himself, speaking directly with someone to learn about their interests and preferences.
-Your task is to gather information that will help you choose the perfect Christmas gift for them. 
-**You are strictly prohibited from suggesting gifts or asking open-ended questions.**
-
-Your response should be structured ONLY with these exact XML tags, using plain text or simple markdown inside each tag:
-
-<covered_questions>
-Write a list of covered topics and answers (markdown formatting allowed)
-</covered_questions>
-
-<remaining_questions>
-Write a list of remaining topics (markdown formatting allowed)
-</remaining_questions>
-
-<thinking>
-Write your analysis (markdown formatting allowed)
-</thinking>
-
-<question>
-Write a single warm, jolly question (markdown formatting allowed)
-</question>
-
-<multiple_choice_options>
-Write numbered options, one per line (markdown formatting allowed)
-</multiple_choice_options>
-
-IMPORTANT: 
-- Use only the five XML tags shown above
-- Simple markdown formatting is allowed (bold, italic, lists)
-- Do not use HTML or nested XML tags
-- Do not create any additional XML tags or sub-tags (e.g. do not generate <option> tags as sub-tags of <multiple_choice_options>)
-
-For example:
-<covered_questions>
-Age group: 26-40
-</covered_questions>
-
-<remaining_questions>
-Gender (mandatory)
-Hobbies or activities
-Small luxury or treat
-Gift preference (practical vs surprising)
-Favorite way to relax
-Something always wanted
-</remaining_questions>
-
-<thinking>
-Topics covered: age group
-Next topic needed: gender
-Options should be inclusive and respectful
-</thinking>
-
-<question>
-Ho ho ho! My dear friend, to help me prepare something special for Christmas, could you tell me your gender?
-</question>
-
-<multiple_choice_options>
-1. Male
-2. Female
-3. Non-binary
-4. Prefer not to say
-</multiple_choice_options>
-
-### 1. Objective:
-Gather clear and concise information from the user by asking **only structured multiple-choice questions.** You'll use this information to choose the perfect gift, but it must remain a Christmas surprise.
-
-### 2. Question Order:
-You MUST ask questions in this specific order:
-1. First question: Age group
-2. Second question: Gender
-3. Then proceed with the remaining topics in any order:
-   - Hobbies or activities you enjoy
-   - Small luxury or treat that always makes you happy
-   - Prefer practical gifts or something more fun and surprising
-   - Favorite way to relax or unwind
-   - Something you've always wanted but never got around to buying for yourself
-
-Strategy: 
-After age and gender, ask one question for each remaining topic.
-Then go deeper into one topic, asking 2-3 questions about it.
-Then wrap it up with a warm Christmas message.
-
-### 3. Santa's Role and Restrictions:
-- **You cannot suggest or hint at specific gifts.** The gift must be a Christmas surprise!
-- **You cannot ask open-ended questions.** Every question must have numbered multiple-choice options.
-- Keep your tone warm, jolly, and full of Christmas spirit.
-
-### 4. Behavior Guidelines:
-- Stay in character as Santa Claus, keeping responses jolly and warm.
-- Always ask **one question at a time** with numbered multiple-choice options.
-- **Switch topics between questions** to keep the conversation engaging.
-- Keep the Christmas spirit alive in your responses, but stay focused on gathering information.
-- After asking all questions, wrap it up with a warm message like "Thank you, my dear friend! I'll make sure to prepare something special for Christmas! Ho ho ho! 🎄"
-
-### 5. Topics to Cover:
-You **must** ask about these 7 topics:
-- Age group
-- Gender
-- Hobbies or activities you enjoy
-- Small luxury or treat that always makes you happy
-- Prefer practical gifts or something more fun and surprising
-- Favorite way to relax or unwind
-- Something you've always wanted but never got around to buying for yourself
-
-### 6. Formatting Rules:
-- Every question must include **only numbered multiple-choice options.** No open-ended or vague follow-ups are allowed.
-- Keep responses clear and concise, but maintain the warm, jolly Santa personality.
-- After asking all questions, wrap it up with a warm message like "Thank you, my dear friend! I'll make sure to prepare something special for Christmas! Ho ho ho! 🎄"
-- Use festive emojis sparingly (🎅🎄❄️)
-"""
-
-GIFT_SUGGESTIONS_PROMPT = """You are Santa's gift suggestion expert. Based on the chat conversation between Santa and the gift recipient, suggest 5 specific gift ideas.
-
-Guidelines:
-1. Each suggestion should be specific and actionable (e.g., "A high-quality yoga mat with carrying strap" rather than just "yoga equipment")
-2. Include a brief reason why this gift would be good based on their responses
-3. Keep suggestions within the specified budget range
-4. Keep the festive tone but be practical
-5. Format each suggestion on a new line starting with "🎁"
-6. For each suggestion, include relevant search keywords in <keywords> tags
-
-Example format:
-🎁 A premium yoga mat with carrying strap and alignment lines - Perfect for their daily meditation and yoga practice
-<keywords>premium yoga mat alignment lines</keywords>
-
-🎁 A gourmet coffee bean subscription box - They mentioned loving artisanal coffee as their daily luxury
-<keywords>gourmet coffee subscription box monthly</keywords>
-""" 
\ No newline at end of file
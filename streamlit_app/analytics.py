@@ -0,0 +1,178 @@
+import os
+import re
+import json
+import atexit
+import logging
+import threading
+from datetime import datetime
+from typing import List, Dict
+
+# Where completed transcripts are archived
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", "analytics")
+# Number of transcripts buffered in memory before they are appended to disk
+TRANSCRIPT_CHUNK_SIZE = int(os.getenv("ANALYTICS_CHUNK_SIZE", "50"))
+# Start a new transcript file once the current one grows past this size
+TRANSCRIPT_MAX_BYTES = int(os.getenv("ANALYTICS_MAX_BYTES", str(10 * 1024 * 1024)))
+
+# In-memory aggregate counters, updated as chats progress and once per completed chat
+analytics_store = {
+    "completed_chats": 0,
+    "total_user_turns": 0,
+    "chats_per_budget": {},
+    "hobbies_per_budget": {},
+    "turns_reached": {},  # turn number -> chats that got that far (0 = chat started)
+    "turns_at_completion": {}
+}
+
+# Wording that marks Santa's "Hobbies or activities you enjoy" question
+HOBBY_QUESTION_WORDS = ("hobb", "activit", "pastime")
+
+_lock = threading.Lock()
+_transcript_buffer = []
+_current_file = None
+
+def _increment(counter: Dict, key, amount: int = 1) -> None:
+    counter[key] = counter.get(key, 0) + amount
+
+def _resolve_answer(question: str, answer: str) -> str:
+    """Map a numeric answer like "2" back to the matching multiple choice option"""
+    answer = answer.strip()
+    if not answer.isdigit():
+        return answer.lower()
+    for line in question.split('\n'):
+        match = re.match(rf'^\s*{answer}[.)]\s*(.+)$', line)
+        if match:
+            return match.group(1).strip().lower()
+    return answer
+
+def extract_hobby_answers(messages: List[Dict]) -> List[str]:
+    """Return the user's answer to Santa's first "Hobbies or activities" question"""
+    for previous, current in zip(messages, messages[1:]):
+        if previous["role"] != "assistant" or current["role"] != "user":
+            continue
+        question = previous["content"].lower()
+        # Follow-up questions that dig deeper into the topic are not counted again
+        if any(word in question for word in HOBBY_QUESTION_WORDS):
+            return [_resolve_answer(previous["content"], current["content"])]
+    return []
+
+def count_user_turns(messages: List[Dict]) -> int:
+    """Count how many answers the user gave before finishing the chat"""
+    return sum(1 for msg in messages if msg["role"] == "user")
+
+def record_chat_turn(turn: int) -> None:
+    """Count a chat reaching the given user turn, 0 when Santa opens the chat"""
+    with _lock:
+        _increment(analytics_store["turns_reached"], turn)
+
+def record_completed_chat(chat_id: str, metadata: dict, responses: List[Dict]) -> None:
+    """
+    Update aggregate counters and queue the transcript for archiving
+
+    Args:
+        chat_id (str): The chat's unique identifier
+        metadata (dict): The chat's stored metadata, marked with
+            'analytics_recorded' so each chat is only counted once
+        responses (list): The chat messages
+    """
+    budget = metadata.get('budget') or "unknown"
+    turns = count_user_turns(responses)
+    hobbies = extract_hobby_answers(responses)
+
+    with _lock:
+        if metadata.get('analytics_recorded'):
+            logging.info(f"Chat {chat_id} already recorded in analytics, skipping")
+            return
+        metadata['analytics_recorded'] = True
+        analytics_store["completed_chats"] += 1
+        analytics_store["total_user_turns"] += turns
+        _increment(analytics_store["chats_per_budget"], budget)
+        _increment(analytics_store["turns_at_completion"], turns)
+        budget_hobbies = analytics_store["hobbies_per_budget"].setdefault(budget, {})
+        for hobby in hobbies:
+            _increment(budget_hobbies, hobby)
+
+        _transcript_buffer.append({
+            "chat_id": chat_id,
+            "completed_at": datetime.now().isoformat(),
+            "budget": metadata.get('budget'),
+            "user_turns": turns,
+            "responses": responses
+        })
+        archive_chunk = len(_transcript_buffer) >= TRANSCRIPT_CHUNK_SIZE
+        if archive_chunk:
+            _flush_locked()
+    
+    # Periodic report, once per archived chunk
+    if archive_chunk:
+        logging.info(f"Analytics summary: {get_analytics_summary()}")
+
+def _next_transcript_file() -> str:
+    """Pick a fresh file name so that existing archives are never rewritten"""
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    index = 0
+    while True:
+        path = os.path.join(ANALYTICS_DIR, f"transcripts-{timestamp}-{index:04d}.jsonl")
+        if not os.path.exists(path):
+            return path
+        index += 1
+
+def _flush_locked() -> None:
+    global _current_file
+    if not _transcript_buffer:
+        return
+    try:
+        os.makedirs(ANALYTICS_DIR, exist_ok=True)
+        if _current_file is None or os.path.getsize(_current_file) >= TRANSCRIPT_MAX_BYTES:
+            _current_file = _next_transcript_file()
+        with open(_current_file, "a", encoding="utf-8") as f:
+            for record in _transcript_buffer:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        logging.info(f"Archived {len(_transcript_buffer)} transcripts to {_current_file}")
+        _transcript_buffer.clear()
+    except Exception as e:
+        # Keep the buffer so the next flush can retry
+        logging.error(f"Failed to archive transcripts: {e}")
+
+def flush_transcripts() -> None:
+    """Write any buffered transcripts to the current archive file"""
+    with _lock:
+        _flush_locked()
+
+def get_analytics_summary() -> dict:
+    """
+    Snapshot of the aggregate counters
+
+    Returns:
+        dict: Started and completed chat counts, average turns to completion,
+        per-budget counts, popular hobbies per budget, the turns at completion
+        histogram and the drop-off histogram (chats that stopped after a turn
+        without being sent, including ones still in progress)
+    """
+    with _lock:
+        completed = analytics_store["completed_chats"]
+        reached = analytics_store["turns_reached"]
+        at_completion = analytics_store["turns_at_completion"]
+        drop_off = {
+            turn: max(count - reached.get(turn + 1, 0) - at_completion.get(turn, 0), 0)
+            for turn, count in sorted(reached.items())
+        }
+        return {
+            "started_chats": reached.get(0, 0),
+            "completed_chats": completed,
+            "average_turns": analytics_store["total_user_turns"] / completed if completed else 0.0,
+            "chats_per_budget": dict(analytics_store["chats_per_budget"]),
+            "popular_hobbies_per_budget": {
+                budget: sorted(hobbies.items(), key=lambda item: item[1], reverse=True)
+                for budget, hobbies in analytics_store["hobbies_per_budget"].items()
+            },
+            "turns_at_completion": dict(sorted(at_completion.items())),
+            "drop_off_turns": {turn: count for turn, count in drop_off.items() if count}
+        }
+
+def _report_on_exit() -> None:
+    """Archive buffered transcripts and log the final summary when the app stops"""
+    flush_transcripts()
+    logging.info(f"Analytics summary: {get_analytics_summary()}")
+
+atexit.register(_report_on_exit)
@@ -2,9 +2,14 @@ import logging
 import streamlit as st
 import openai  # Change to direct import
 import os
+import html
+import time
 from datetime import datetime
-from data_store import generate_chat_link, save_chat_and_generate_result_link, get_gift_suggestions, is_valid_email, get_chat_data
-from ai_operations import generate_santa_response, SANTA_PROMPT  # Add SANTA_PROMPT to import
+from urllib.parse import urlparse
+from data_store import generate_chat_link, save_chat_and_generate_result_link, get_gift_suggestions, get_suggestion_status, retry_gift_suggestions, is_valid_email, get_chat_data
+from analytics import record_chat_turn, count_user_turns
+from ai_operations import generate_santa_response
+from prompts import SANTA_PROMPT
 
 # Configure base URL
 BASE_URL = os.getenv("BASE_URL", "https://chatwithsanta.streamlit.app")
@@ -97,6 +102,69 @@ def _get_ai_response_impl(messages, budget):
         st.error("Oh candy canes! Something went wrong. Please try again!")
     return None
 
+def render_product_link(product):
+    """Product title as an escaped link, or plain text if the URL isn't http(s)"""
+    title = html.escape(product.get('title', ''))
+    url = product.get('url') or ''
+    if urlparse(url).scheme.lower() not in ("http", "https"):
+        return title
+    return f"<a href=\"{html.escape(url, quote=True)}\" target=\"_blank\">{title}</a>"
+
+def render_suggestion_card(suggestion):
+    """Render a single gift suggestion as a card on the results page"""
+    # Create Amazon search URL using the suggestion text
+    suggestion_text = suggestion['text']  # Extract text from suggestion dictionary
+    keywords = suggestion['keywords']  # Get keywords for better search results
+    search_terms = keywords if keywords else suggestion_text
+    amazon_search_url = f"https://www.amazon.com/s?k={'+'.join(search_terms.split())}"
+    
+    # Concrete products matched from the local catalog, if available
+    products_html = "".join(
+        f"<li>{render_product_link(product)}"
+        + (f" - ${product['price']:.2f}" if product.get('price') is not None else "")
+        + "</li>"
+        for product in suggestion.get('products', [])
+    )
+    if products_html:
+        products_html = f"<ul style='margin: 10px 0 0 0;'>{products_html}</ul>"
+    
+    st.markdown(f"""
+    <div style='
+        background-color: #f0f8ff; 
+        padding: 20px; 
+        border-radius: 10px; 
+        margin: 10px 0;
+        border: 2px solid #e1e4e8;
+        color: #1e1e1e;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        font-size: 16px;
+        line-height: 1.5;
+    '>
+        {suggestion_text}{products_html}
+        <br><br>
+        <a href="{amazon_search_url}" target="_blank" style="
+            display: inline-block;
+            padding: 8px 16px;
+            background-color: #FF9900;
+            color: white;
+            text-decoration: none;
+            border-radius: 5px;
+            font-size: 14px;
+        ">
+            🔍 Search on Amazon
+        </a>
+    </div>
+    """, unsafe_allow_html=True)
+
+def render_generation_failed(result_link):
+    """Show the failure message with a button to generate the suggestions again"""
+    st.error("Oh candy canes! Santa's workshop couldn't come up with gift ideas this time. 🎅")
+    if st.button("Ask Santa to try again 🔄"):
+        if retry_gift_suggestions(result_link):
+            st.rerun()
+        else:
+            st.error("Oh no! Santa couldn't find the chat for this link. Please ask your friend to send it again! 🎅")
+
 # Get URL parameters
 chat_link = st.query_params.get("chat", None)
 result_link = st.query_params.get("result", None)
@@ -112,59 +180,46 @@ if result_link:
     
     st.title("🎁 Santa's Christmas Surprise")
     suggestions = get_gift_suggestions(result_link)
+    status = get_suggestion_status(result_link)
     
-    if suggestions:
+    if suggestions is not None and status != "failed":
         st.markdown("""
         Ho ho ho! 🎅✨
         
         Based on my wonderful chat with your special someone, I've carefully selected some gift ideas that I think they'll love:
         """)
         
-        # Create a nice card-like display for each suggestion
-        for suggestion in suggestions:
-            # Create Amazon search URL using the suggestion text
-            suggestion_text = suggestion['text']  # Extract text from suggestion dictionary
-            keywords = suggestion['keywords']  # Get keywords for better search results
-            search_terms = keywords if keywords else suggestion_text
-            amazon_search_url = f"https://www.amazon.com/s?k={'+'.join(search_terms.split())}"
+        # Show each card as soon as it is generated, keeping the progress note below them
+        cards = st.container()
+        progress = st.empty()
+        rendered = 0
+        while True:
+            # Read the status first so no suggestion added before completion is missed
+            status = get_suggestion_status(result_link)
+            with cards:
+                for suggestion in suggestions[rendered:]:
+                    render_suggestion_card(suggestion)
+                    rendered += 1
+            if status != "generating":
+                break
+            progress.info("🎄 Santa's elves are still wrapping more ideas...")
+            time.sleep(0.3)
+        progress.empty()
+        
+        if rendered:
+            st.markdown("""
+            ---
+            💝 Remember, these are just suggestions! The best gifts come from the heart.
             
-            st.markdown(f"""
-            <div style='
-                background-color: #f0f8ff; 
-                padding: 20px; 
-                border-radius: 10px; 
-                margin: 10px 0;
-                border: 2px solid #e1e4e8;
-                color: #1e1e1e;
-                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                font-size: 16px;
-                line-height: 1.5;
-            '>
-                {suggestion_text}
-                <br><br>
-                <a href="{amazon_search_url}" target="_blank" style="
-                    display: inline-block;
-                    padding: 8px 16px;
-                    background-color: #FF9900;
-                    color: white;
-                    text-decoration: none;
-                    border-radius: 5px;
-                    font-size: 14px;
-                ">
-                    🔍 Search on Amazon
-                </a>
-            </div>
-            """, unsafe_allow_html=True)
+            🎄 Want to find a gift for someone else? [Start a new gift search](/)
+            """)
             
-        st.markdown("""
-        ---
-        💝 Remember, these are just suggestions! The best gifts come from the heart.
-        
-        🎄 Want to find a gift for someone else? [Start a new gift search](/)
-        """)
-        
-        # Add some festive decorations
-        st.snow()  # Add some snowfall effect
+            # Add some festive decorations
+            st.snow()  # Add some snowfall effect
+        else:
+            render_generation_failed(result_link)
+    elif status == "failed":
+        render_generation_failed(result_link)
     else:
         st.error("Oh no! This gift suggestion link seems to be invalid. Please check with your friend for the correct link! 🎅")
         st.markdown("Want to start your own gift search? [Click here](/) to begin!")
@@ -205,6 +260,7 @@ elif chat_link:
                 "content": initial_response
             }
             st.session_state.messages.append(initial_message)
+            record_chat_turn(0)
             logging.info(f"Initial AI message generated: {initial_response}")
         else:
             logging.error("Failed to generate initial AI message")
@@ -220,6 +276,7 @@ elif chat_link:
         
         # Add user message to chat history
         st.session_state.messages.append({"role": "user", "content": prompt})
+        record_chat_turn(count_user_turns(st.session_state.messages))
         
         # Display user message
         with st.chat_message("user"):
@@ -0,0 +1,81 @@
+"""Benchmark product index build time and query latency on a synthetic catalog
+
+Titles and queries are drawn from a Zipf-like vocabulary, so the most common
+words (e.g. "gift", "premium") appear in a large share of the catalog, as
+they do in real product data.
+
+Usage:
+    python streamlit_app/bench_product_index.py [num_products]
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+from itertools import accumulate
+from product_index import build_product_index, ProductIndex
+
+BUDGETS = ["Under $25", "$25 - $50", "$50 - $100", "$100 - $200", "$200 - $500", "Over $500"]
+
+# The highest ranked words of the synthetic vocabulary
+COMMON_WORDS = ["gift", "premium", "mug", "coffee", "women", "men", "kids", "portable",
+                "wireless", "black", "leather", "mini", "personalized", "travel", "home"]
+
+def zipf_vocabulary(vocab_size: int = 50000, exponent: float = 1.0):
+    """Return the vocabulary and cumulative Zipf weights for sampling from it"""
+    vocab = COMMON_WORDS + [f"word{i}" for i in range(vocab_size - len(COMMON_WORDS))]
+    weights = [1 / (rank + 1) ** exponent for rank in range(len(vocab))]
+    return vocab, list(accumulate(weights))
+
+def write_synthetic_catalog(path: str, num_products: int, vocab: list, cum_weights: list) -> None:
+    """Write random products with Zipf-distributed title words"""
+    rng = random.Random(42)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(num_products):
+            title = " ".join(rng.choices(vocab, cum_weights=cum_weights, k=rng.randint(4, 12)))
+            f.write(json.dumps({
+                "title": title,
+                "price": round(rng.uniform(5, 1000), 2),
+                "url": f"https://example.com/p/{i}"
+            }) + "\n")
+
+def percentiles(latencies: list) -> str:
+    latencies = sorted(latencies)
+    return (f"p50 {latencies[len(latencies) // 2]:.2f}ms, "
+            f"p95 {latencies[int(len(latencies) * 0.95)]:.2f}ms, "
+            f"max {latencies[-1]:.2f}ms")
+
+def time_queries(index: ProductIndex, queries: list, budget_choices: list) -> str:
+    rng = random.Random(7)
+    latencies = []
+    for keywords in queries:
+        start = time.perf_counter()
+        index.search(keywords, rng.choice(budget_choices))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return percentiles(latencies)
+
+def main(num_products: int = 1_000_000, num_queries: int = 200) -> None:
+    vocab, cum_weights = zipf_vocabulary()
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog_path = os.path.join(tmp, "products.jsonl")
+        index_dir = os.path.join(tmp, "index")
+        write_synthetic_catalog(catalog_path, num_products, vocab, cum_weights)
+
+        start = time.perf_counter()
+        build_product_index(catalog_path, index_dir)
+        print(f"Build: {num_products} products in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        index = ProductIndex(index_dir)
+        print(f"Load: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        rng = random.Random(11)
+        zipf_queries = [" ".join(rng.choices(vocab, cum_weights=cum_weights, k=4)) for _ in range(num_queries)]
+        common_queries = [" ".join(rng.sample(COMMON_WORDS, 3)) for _ in range(num_queries)]
+        for name, queries in (("Zipf", zipf_queries), ("Common terms", common_queries)):
+            print(f"{name} queries with budget: {time_queries(index, queries, BUDGETS)}")
+            print(f"{name} queries without budget: {time_queries(index, queries, [None])}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
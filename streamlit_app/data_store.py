@@ -1,13 +1,17 @@
 import uuid
 import logging
 import os
+import time
+import threading
 from typing import Optional
 from datetime import datetime
 import re
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from ai_operations import generate_gift_suggestions  # Add this import
+from ai_operations import stream_gift_suggestions
+from analytics import record_completed_chat
+from product_index import attach_products
 
 # In-memory storage
 data_store = {}
@@ -16,6 +20,8 @@ data_store = {}
 GMAIL_USER = os.getenv("GMAIL_USER")
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
 BASE_URL = os.getenv("BASE_URL", "https://chatwithsanta.streamlit.app")
+# Give up on gift suggestions that are still generating after this long
+SUGGESTION_TIMEOUT_SECONDS = int(os.getenv("SUGGESTION_TIMEOUT_SECONDS", "120"))
 
 def is_valid_email(email: str) -> bool:
     """Validate email format using regex pattern"""
@@ -73,27 +79,87 @@ def save_chat_and_generate_result_link(link_a, responses):
     if link_a not in data_store:
         return None
     
-    link_b = str(uuid.uuid4())
+    # Snapshot the session's messages, the recipient may keep chatting after sending
+    responses = [dict(msg) for msg in responses]
+    
+    # Sending again while suggestions are generating keeps the same link,
+    # and a failed link is reused so the gift giver's link starts working
+    previous_link = data_store[link_a].get("result_link")
+    previous_status = get_suggestion_status(previous_link) if previous_link else None
+    if previous_status == "generating":
+        return previous_link
+    
+    link_b = previous_link if previous_status == "failed" else str(uuid.uuid4())
     data_store[link_a].update({
         "user2_responses": responses,
         "result_link": link_b,
         "status": "completed"
     })
     
-    # Get the budget from metadata for gift suggestions
-    budget = data_store[link_a].get('budget')
-    suggestions = generate_gift_suggestions(responses, budget)  # Using the imported function
-    if not suggestions:
-        return None
+    # Count the questionnaire as completed whether or not generation succeeds.
+    # Analytics must never block the result link
+    try:
+        record_completed_chat(link_a, data_store[link_a], responses)
+    except Exception as e:
+        logging.error(f"Failed to record chat analytics: {e}")
+    
+    _start_generation(link_a, link_b, responses)
+    return link_b
+
+def retry_gift_suggestions(link_b):
+    """Generate suggestions again for a failed result link, returns False if it can't be retried"""
+    if get_suggestion_status(link_b) != "failed":
+        return False
+    link_a = data_store[link_b]["parent_chat"]
+    responses = data_store.get(link_a, {}).get("user2_responses")
+    if responses is None:
+        return False
+    _start_generation(link_a, link_b, responses)
+    return True
 
+def _start_generation(link_a, link_b, responses):
+    """Reset the result link and generate its suggestions in a background thread"""
+    # The result page shows suggestions as they arrive while generation continues in the background
     data_store[link_b] = {
-        "gift_suggestions": suggestions,
-        "parent_chat": link_a
+        "gift_suggestions": [],
+        "parent_chat": link_a,
+        "status": "generating",  # generating, completed, failed
+        "deadline": time.monotonic() + SUGGESTION_TIMEOUT_SECONDS
     }
+    threading.Thread(
+        target=_generate_suggestions_in_background,
+        args=(link_a, link_b, responses),
+        daemon=True
+    ).start()
+
+def _generate_suggestions_in_background(link_a, link_b, responses):
+    """Stream gift suggestions into the data store, then notify the gift giver"""
+    # Get the budget from metadata for gift suggestions
+    budget = data_store[link_a].get('budget')
+    try:
+        for suggestion in stream_gift_suggestions(responses, budget, timeout=SUGGESTION_TIMEOUT_SECONDS):
+            # The deadline only stops the stream, suggestions that arrived are kept
+            if get_suggestion_status(link_b) != "generating":
+                break
+            attach_products([suggestion], budget)
+            data_store[link_b]["gift_suggestions"].append(suggestion)
+    except Exception as e:
+        logging.error(f"Error generating gift ideas: {e}")
+    
+    # Settle the status unless the deadline already did
+    if get_suggestion_status(link_b) == "generating":
+        data_store[link_b]["status"] = "completed" if data_store[link_b]["gift_suggestions"] else "failed"
+    
+    notify_gift_giver(link_a, link_b)
+
+def notify_gift_giver(link_a, link_b):
+    """Email the gift giver whether their suggestions are ready or failed"""
+    notification_email = data_store[link_a].get('notification_email')
+    if not notification_email:
+        return
     
-    # Send notification if email is available
-    if notification_email := data_store[link_a].get('notification_email'):
-        full_result_url = f"{BASE_URL}?result={link_b}"
+    full_result_url = f"{BASE_URL}?result={link_b}"
+    if data_store[link_b].get("status") == "completed":
         email_subject = "🎁 Your Gift Suggestions Are Ready!"
         email_body = f"""
         <html>
@@ -106,19 +172,40 @@ def save_chat_and_generate_result_link(link_a, responses):
         </body>
         </html>
         """
-        
-        if send_email(notification_email, email_subject, email_body):
-            logging.info(f"Notification email sent to {notification_email}")
-        else:
-            logging.error(f"Failed to send notification email to {notification_email}")
+    else:
+        email_subject = "🎅 Santa Couldn't Prepare Your Gift Suggestions"
+        email_body = f"""
+        <html>
+        <body>
+        <h2>Oh candy canes! 🎅</h2>
+        <p>The person you're buying a gift for has finished chatting with Santa, but Santa's workshop couldn't come up with gift ideas this time.</p>
+        <p>Open the link below and ask Santa to try again:</p>
+        <p><a href="{full_result_url}">View Gift Suggestions</a></p>
+        </body>
+        </html>
+        """
     
-    return link_b
+    if send_email(notification_email, email_subject, email_body):
+        logging.info(f"Notification email sent to {notification_email}")
+    else:
+        logging.error(f"Failed to send notification email to {notification_email}")
 
 def get_gift_suggestions(link_b):
     if link_b not in data_store:
         return None
     return data_store[link_b]["gift_suggestions"]
 
+def get_suggestion_status(link_b):
+    """Return 'generating', 'completed' or 'failed' for a result link, or None if unknown"""
+    if link_b not in data_store:
+        return None
+    result = data_store[link_b]
+    if result.get("status") == "generating" and time.monotonic() > result["deadline"]:
+        # Keep whatever arrived before the deadline
+        logging.error(f"Gift suggestions for {link_b} timed out after {SUGGESTION_TIMEOUT_SECONDS}s")
+        result["status"] = "completed" if result["gift_suggestions"] else "failed"
+    return result.get("status", "completed")
+
 def get_chat_data(chat_id):
     """
     Retrieve chat metadata from storage
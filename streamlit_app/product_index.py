@@ -0,0 +1,209 @@
+import os
+import re
+import json
+import math
+import mmap
+import heapq
+import logging
+from array import array
+from typing import Optional, List, Dict, Tuple
+
+# Local catalog (JSONL with "title", "price" and "url" per line) and its prebuilt index
+PRODUCT_CATALOG_PATH = os.getenv("PRODUCT_CATALOG_PATH", "catalog/products.jsonl")
+PRODUCT_INDEX_DIR = os.getenv("PRODUCT_INDEX_DIR", "catalog/index")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Postings are stored best match first, so a query only reads the head of each
+# term's list. Common terms like "gift" would otherwise scan most of the catalog.
+MAX_MATCHES_PER_TERM = 1000
+MAX_POSTINGS_SCANNED_PER_TERM = 20000
+SCAN_CHUNK_SIZE = 1000
+
+STOPWORDS = {"a", "an", "and", "the", "for", "with", "of", "in", "on", "to", "set", "kit"}
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase text and split it into searchable terms"""
+    return [t for t in re.findall(r'[a-z0-9]+', text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+def parse_budget_range(budget: Optional[str]) -> Tuple[float, float]:
+    """Turn a budget label like "$25 - $50" or "Under $25" into a (min, max) price range"""
+    if not budget:
+        return 0.0, math.inf
+    amounts = [float(a) for a in re.findall(r'\d+(?:\.\d+)?', budget)]
+    if not amounts:
+        return 0.0, math.inf
+    if budget.lower().startswith("under"):
+        return 0.0, amounts[0]
+    if budget.lower().startswith("over"):
+        return amounts[0], math.inf
+    return amounts[0], amounts[-1]
+
+def build_product_index(catalog_path: str = PRODUCT_CATALOG_PATH, index_dir: str = PRODUCT_INDEX_DIR) -> int:
+    """
+    Build the on-disk inverted index for a product catalog
+
+    Args:
+        catalog_path (str): JSONL file with one product per line
+        index_dir (str): Directory the index files are written to
+
+    Returns:
+        int: Number of indexed products
+    """
+    postings = {}
+    doc_lens = array('H')
+    prices = array('f')
+    product_offsets = array('Q')
+
+    os.makedirs(index_dir, exist_ok=True)
+    with open(catalog_path, encoding="utf-8") as catalog, \
+            open(os.path.join(index_dir, "products.jsonl"), "wb") as products:
+        for line in catalog:
+            if not line.strip():
+                continue
+            product = json.loads(line)
+            doc_id = len(doc_lens)
+            terms = tokenize(product.get("title", ""))
+
+            term_freqs = {}
+            for term in terms:
+                term_freqs[term] = term_freqs.get(term, 0) + 1
+            for term, tf in term_freqs.items():
+                if term not in postings:
+                    postings[term] = (array('I'), array('H'))
+                docs, tfs = postings[term]
+                docs.append(doc_id)
+                tfs.append(min(tf, 0xFFFF))
+
+            doc_lens.append(min(len(terms), 0xFFFF))
+            price = float(product["price"]) if product.get("price") is not None else None
+            prices.append(price if price is not None else math.nan)
+            product_offsets.append(products.tell())
+            record = {"title": product.get("title", ""), "price": price, "url": product.get("url", "")}
+            products.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    num_docs = len(doc_lens)
+    avg_doc_len = (sum(doc_lens) / num_docs if num_docs else 0.0) or 1.0
+
+    vocab = {}
+    position = 0
+    with open(os.path.join(index_dir, "postings_docs.bin"), "wb") as docs_file, \
+            open(os.path.join(index_dir, "postings_impacts.bin"), "wb") as impacts_file:
+        for term, (docs, tfs) in postings.items():
+            # BM25 term weight without idf, which is applied at query time
+            impacts = [
+                tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * doc_lens[doc_id] / avg_doc_len))
+                for doc_id, tf in zip(docs, tfs)
+            ]
+            order = sorted(range(len(docs)), key=impacts.__getitem__, reverse=True)
+            vocab[term] = [position, len(docs)]
+            array('I', (docs[i] for i in order)).tofile(docs_file)
+            array('f', (impacts[i] for i in order)).tofile(impacts_file)
+            position += len(docs)
+
+    for name, values in (("prices.bin", prices), ("product_offsets.bin", product_offsets)):
+        with open(os.path.join(index_dir, name), "wb") as f:
+            values.tofile(f)
+
+    with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "num_docs": num_docs,
+            "vocab": vocab
+        }, f)
+
+    logging.info(f"Indexed {num_docs} products into {index_dir}")
+    return num_docs
+
+def _map_array(path: str, typecode: str):
+    """Memory-map a binary array file written by build_product_index"""
+    if os.path.getsize(path) == 0:
+        return memoryview(array(typecode))
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped).cast(typecode)
+
+class ProductIndex:
+    """BM25 search over a prebuilt, memory-mapped product index"""
+
+    def __init__(self, index_dir: str = PRODUCT_INDEX_DIR):
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.num_docs = meta["num_docs"]
+        self.vocab = meta["vocab"]
+
+        self.postings_docs = _map_array(os.path.join(index_dir, "postings_docs.bin"), 'I')
+        self.postings_impacts = _map_array(os.path.join(index_dir, "postings_impacts.bin"), 'f')
+        self.prices = _map_array(os.path.join(index_dir, "prices.bin"), 'f')
+        self.product_offsets = _map_array(os.path.join(index_dir, "product_offsets.bin"), 'Q')
+        self.products_path = os.path.join(index_dir, "products.jsonl")
+
+    def search(self, keywords: str, budget: Optional[str] = None, top_k: int = 3) -> List[Dict]:
+        """
+        Return the top products matching the keywords within the budget range
+
+        Each term contributes only its highest impact postings, which keeps
+        queries on common terms fast at the cost of an approximate ranking.
+        """
+        min_price, max_price = parse_budget_range(budget)
+        check_price = budget is not None
+        docs, impacts, prices = self.postings_docs, self.postings_impacts, self.prices
+
+        scores = {}
+        for term in set(tokenize(keywords)):
+            if term not in self.vocab:
+                continue
+            start, count = self.vocab[term]
+            idf = math.log(1 + (self.num_docs - count + 0.5) / (count + 0.5))
+            end = start + min(count, MAX_POSTINGS_SCANNED_PER_TERM)
+            matches = 0
+            for chunk_start in range(start, end, SCAN_CHUNK_SIZE):
+                chunk_end = min(chunk_start + SCAN_CHUNK_SIZE, end)
+                for doc_id, impact in zip(docs[chunk_start:chunk_end].tolist(), impacts[chunk_start:chunk_end].tolist()):
+                    if check_price and not (min_price <= prices[doc_id] <= max_price):
+                        continue
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * impact
+                    matches += 1
+                if matches >= MAX_MATCHES_PER_TERM:
+                    break
+
+        top = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [self._load_product(doc_id) for doc_id, _ in top]
+
+    def _load_product(self, doc_id: int) -> Dict:
+        with open(self.products_path, "rb") as f:
+            f.seek(self.product_offsets[doc_id])
+            return json.loads(f.readline())
+
+_product_index = None
+
+def get_product_index() -> Optional[ProductIndex]:
+    """Load the product index once, or return None if it hasn't been built"""
+    global _product_index
+    if _product_index is None:
+        if not os.path.exists(os.path.join(PRODUCT_INDEX_DIR, "meta.json")):
+            return None
+        try:
+            _product_index = ProductIndex(PRODUCT_INDEX_DIR)
+        except Exception as e:
+            logging.error(f"Failed to load product index: {e}")
+            return None
+    return _product_index
+
+def attach_products(suggestions: List[Dict], budget: Optional[str] = None, top_k: int = 3) -> List[Dict]:
+    """Add matching catalog products to each gift suggestion"""
+    index = get_product_index()
+    if index is None:
+        return suggestions
+    for suggestion in suggestions:
+        search_terms = suggestion.get("keywords") or suggestion.get("text", "")
+        try:
+            suggestion["products"] = index.search(search_terms, budget, top_k)
+        except Exception as e:
+            logging.error(f"Product lookup failed for '{search_terms}': {e}")
+    return suggestions
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    build_product_index()
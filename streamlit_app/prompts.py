@@ -0,0 +1,269 @@
+import json
+import atexit
+import hashlib
+import logging
+import textwrap
+import threading
+from functools import lru_cache
+from typing import Optional, List, Dict, Tuple
+
+# Bump a version whenever the text of its static sections changes
+SANTA_PROMPT_VERSION = "santa-v2"
+GIFT_SUGGESTIONS_PROMPT_VERSION = "gifts-v2"
+
+# Constants
+SANTA_PROMPT = """You are Santa Claus himself, speaking directly with someone to learn about their interests and preferences.
+Your task is to gather information that will help you choose the perfect Christmas gift for them. 
+**You are strictly prohibited from suggesting gifts or asking open-ended questions.**
+
+Your response should be structured ONLY with these exact XML tags, using plain text or simple markdown inside each tag:
+
+<covered_questions>
+Write a list of covered topics and answers (markdown formatting allowed)
+</covered_questions>
+
+<remaining_questions>
+Write a list of remaining topics (markdown formatting allowed)
+</remaining_questions>
+
+<thinking>
+Write your analysis (markdown formatting allowed)
+</thinking>
+
+<question>
+Write a single warm, jolly question (markdown formatting allowed)
+</question>
+
+<multiple_choice_options>
+Write numbered options, one per line (markdown formatting allowed)
+</multiple_choice_options>
+
+IMPORTANT: 
+- Use only the five XML tags shown above
+- Simple markdown formatting is allowed (bold, italic, lists)
+- Do not use HTML or nested XML tags
+- Do not create any additional XML tags or sub-tags (e.g. do not generate <option> tags as sub-tags of <multiple_choice_options>)
+
+For example:
+<covered_questions>
+Age group: 26-40
+</covered_questions>
+
+<remaining_questions>
+Gender (mandatory)
+Hobbies or activities
+Small luxury or treat
+Gift preference (practical vs surprising)
+Favorite way to relax
+Something always wanted
+</remaining_questions>
+
+<thinking>
+Topics covered: age group
+Next topic needed: gender
+Options should be inclusive and respectful
+</thinking>
+
+<question>
+Ho ho ho! My dear friend, to help me prepare something special for Christmas, could you tell me your gender?
+</question>
+
+<multiple_choice_options>
+1. Male
+2. Female
+3. Non-binary
+4. Prefer not to say
+</multiple_choice_options>
+
+### 1. Objective:
+Gather clear and concise information from the user by asking **only structured multiple-choice questions.** You'll use this information to choose the perfect gift, but it must remain a Christmas surprise.
+
+### 2. Question Order:
+You MUST ask questions in this specific order:
+1. First question: Age group
+2. Second question: Gender
+3. Then proceed with the remaining topics in any order:
+   - Hobbies or activities you enjoy
+   - Small luxury or treat that always makes you happy
+   - Prefer practical gifts or something more fun and surprising
+   - Favorite way to relax or unwind
+   - Something you've always wanted but never got around to buying for yourself
+
+Strategy: 
+After age and gender, ask one question for each remaining topic.
+Then go deeper into one topic, asking 2-3 questions about it.
+Then wrap it up with a warm Christmas message.
+
+### 3. Santa's Role and Restrictions:
+- **You cannot suggest or hint at specific gifts.** The gift must be a Christmas surprise!
+- **You cannot ask open-ended questions.** Every question must have numbered multiple-choice options.
+- Keep your tone warm, jolly, and full of Christmas spirit.
+
+### 4. Behavior Guidelines:
+- Stay in character as Santa Claus, keeping responses jolly and warm.
+- Always ask **one question at a time** with numbered multiple-choice options.
+- **Switch topics between questions** to keep the conversation engaging.
+- Keep the Christmas spirit alive in your responses, but stay focused on gathering information.
+- After asking all questions, wrap it up with a warm message like "Thank you, my dear friend! I'll make sure to prepare something special for Christmas! Ho ho ho! 🎄"
+
+### 5. Topics to Cover:
+You **must** ask about these 7 topics:
+- Age group
+- Gender
+- Hobbies or activities you enjoy
+- Small luxury or treat that always makes you happy
+- Prefer practical gifts or something more fun and surprising
+- Favorite way to relax or unwind
+- Something you've always wanted but never got around to buying for yourself
+
+### 6. Formatting Rules:
+- Every question must include **only numbered multiple-choice options.** No open-ended or vague follow-ups are allowed.
+- Keep responses clear and concise, but maintain the warm, jolly Santa personality.
+- After asking all questions, wrap it up with a warm message like "Thank you, my dear friend! I'll make sure to prepare something special for Christmas! Ho ho ho! 🎄"
+- Use festive emojis sparingly (🎅🎄❄️)
+"""
+
+GIFT_SUGGESTIONS_PROMPT = """You are Santa's gift suggestion expert. Based on the chat conversation between Santa and the gift recipient, suggest 5 specific gift ideas.
+
+Guidelines:
+1. Each suggestion should be specific and actionable (e.g., "A high-quality yoga mat with carrying strap" rather than just "yoga equipment")
+2. Include a brief reason why this gift would be good based on their responses
+3. Keep suggestions within the specified budget range
+4. Keep the festive tone but be practical
+5. Format each suggestion on a new line starting with "🎁"
+6. For each suggestion, include relevant search keywords in <keywords> tags
+
+Example format:
+🎁 A premium yoga mat with carrying strap and alignment lines - Perfect for their daily meditation and yoga practice
+<keywords>premium yoga mat alignment lines</keywords>
+
+🎁 A gourmet coffee bean subscription box - They mentioned loving artisanal coffee as their daily luxury
+<keywords>gourmet coffee subscription box monthly</keywords>
+""" 
+STRUCTURE_REMINDER = "Remember to structure your response with all XML tags: <covered_questions>, <remaining_questions>, <thinking>, <question>, and <multiple_choice_options>. This is crucial for tracking conversation progress."
+
+BUDGET_PROMPT_TEMPLATE = textwrap.dedent("""\
+    IMPORTANT: The gift budget is {budget}.
+    - Ensure all questions consider this budget range
+    - Adjust options to be appropriate for this price range
+    - Focus on value-oriented questions for lower budgets
+    - Consider luxury preferences for higher budgets""")
+
+# Sections that are byte-identical for every request, so the provider can cache them
+SANTA_STATIC_MESSAGES = [
+    {"role": "system", "content": SANTA_PROMPT},
+    {"role": "system", "content": STRUCTURE_REMINDER}
+]
+GIFT_SUGGESTIONS_STATIC_MESSAGES = [
+    {"role": "system", "content": GIFT_SUGGESTIONS_PROMPT}
+]
+
+def prompt_hash(static_messages: List[Dict]) -> str:
+    """Short fingerprint of the static prefix, to tell prompt revisions apart in logs"""
+    serialized = json.dumps(static_messages, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()[:12]
+
+SANTA_PROMPT_ID = f"{SANTA_PROMPT_VERSION}:{prompt_hash(SANTA_STATIC_MESSAGES)}"
+GIFT_SUGGESTIONS_PROMPT_ID = f"{GIFT_SUGGESTIONS_PROMPT_VERSION}:{prompt_hash(GIFT_SUGGESTIONS_STATIC_MESSAGES)}"
+
+def santa_prompt_sections(messages: List[Dict], budget: Optional[str] = None) -> List[Tuple[str, List[Dict]]]:
+    """Santa turn prompt as named sections, static prefix first and per-chat content last"""
+    budget_messages = [{"role": "system", "content": BUDGET_PROMPT_TEMPLATE.format(budget=budget)}] if budget else []
+    return [
+        ("static", SANTA_STATIC_MESSAGES),
+        ("budget", budget_messages),
+        ("history", list(messages))
+    ]
+
+def gift_suggestions_prompt_sections(chat_summary: str, budget: Optional[str] = None) -> List[Tuple[str, List[Dict]]]:
+    """Gift suggestion prompt as named sections, static prefix first and per-chat content last"""
+    budget_messages = [{"role": "system", "content": f"Budget range: {budget}"}] if budget else []
+    return [
+        ("static", GIFT_SUGGESTIONS_STATIC_MESSAGES),
+        ("budget", budget_messages),
+        ("chat_summary", [{"role": "user", "content": chat_summary}])
+    ]
+
+def assemble_messages(sections: List[Tuple[str, List[Dict]]]) -> List[Dict]:
+    """Flatten prompt sections into the message list sent to the API"""
+    return [message for _, section in sections for message in section]
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    """Load the optional tokenizer on first use, its BPE file may need downloading"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")  # GPT-4o tokenizer
+    except (ImportError, Exception) as e:
+        logging.warning(f"tiktoken unavailable: {e}. Estimating prompt tokens from text length.")
+        return None
+
+@lru_cache(maxsize=256)
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, or estimate roughly four characters per token without it"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def section_token_counts(sections: List[Tuple[str, List[Dict]]]) -> Dict[str, int]:
+    """Token count of each prompt section's message contents"""
+    return {name: sum(count_tokens(msg["content"]) for msg in section) for name, section in sections}
+
+# Running totals per prompt id, used to measure how much of each prompt the provider cached
+prompt_cache_stats = {}
+_stats_lock = threading.Lock()
+# Log the running totals every this many calls of a prompt
+PROMPT_STATS_LOG_EVERY = 50
+
+def record_prompt_usage(prompt_id: str, usage, section_tokens: Optional[Dict[str, int]] = None) -> None:
+    """Log cached vs uncached prompt tokens from an API usage object and add them to the totals"""
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+
+    with _stats_lock:
+        stats = prompt_cache_stats.setdefault(prompt_id, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0})
+        stats["calls"] += 1
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_tokens"] += cached_tokens
+        report_totals = stats["calls"] % PROMPT_STATS_LOG_EVERY == 0
+
+    cached_share = cached_tokens / prompt_tokens if prompt_tokens else 0.0
+    logging.info(
+        f"Prompt {prompt_id}: {prompt_tokens} prompt tokens, {cached_tokens} cached, "
+        f"{prompt_tokens - cached_tokens} uncached ({cached_share:.0%} cached)"
+        + (f", sections {section_tokens}" if section_tokens else "")
+    )
+    if report_totals:
+        _log_prompt_cache_stats()
+
+def get_prompt_cache_stats() -> Dict[str, Dict]:
+    """
+    Snapshot of prompt token totals
+
+    Returns:
+        dict: Per prompt id, the number of calls, prompt tokens, cached and
+        uncached tokens and the share of prompt tokens served from cache
+    """
+    with _stats_lock:
+        return {
+            prompt_id: {
+                **stats,
+                "uncached_tokens": stats["prompt_tokens"] - stats["cached_tokens"],
+                "cached_share": stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+            }
+            for prompt_id, stats in prompt_cache_stats.items()
+        }
+
+def _log_prompt_cache_stats() -> None:
+    """Log cached vs uncached prompt token totals, periodically and when the app stops"""
+    for prompt_id, stats in get_prompt_cache_stats().items():
+        logging.info(
+            f"Prompt {prompt_id} totals: {stats['calls']} calls, {stats['prompt_tokens']} prompt tokens, "
+            f"{stats['cached_tokens']} cached, {stats['uncached_tokens']} uncached ({stats['cached_share']:.0%} cached)"
+        )
+
+atexit.register(_log_prompt_cache_stats)